@@ -4,18 +4,27 @@ Receives prompts from frontend and spawns multiple Claude agents via MCP.
 """
 
 import asyncio
+import atexit
+import codecs
+import collections
+import contextlib
+import functools
 import os
-import json
 import logging
+import queue
+import re
 import traceback
 import sys
 import subprocess
 import shutil
-import uuid
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
-from typing import List, Dict, Any, Tuple
-from flask import Flask, request, jsonify
+from urllib.parse import quote
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Dict, Any, Optional, Tuple, Callable
+import orjson
+from quart import Quart, Response, request, send_file
 from claude_agent_sdk import query, ClaudeAgentOptions, ResultMessage
 
 # Configuration
@@ -25,52 +34,137 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 # Ensure log directory exists
 os.makedirs(LOG_DIR, exist_ok=True)
 
+class BatchingRotatingFileHandler(RotatingFileHandler):
+    """
+    Rotating file handler that leaves flushing to its caller.
+
+    Records are written into the file object's buffer, so a burst of records
+    costs one write syscall when the buffer is flushed instead of a write
+    (and a tell) per record. The file size is re-read from the file after
+    every flush, so writes of other worker processes sharing the log count
+    towards maxBytes; within a batch, this process's encoded bytes are added.
+    """
+
+    def _open(self):
+        stream = super()._open()
+        self.bytes_written = os.fstat(stream.fileno()).st_size
+        return stream
+
+    def flush(self):
+        super().flush()
+        self.acquire()
+        try:
+            if self.stream is not None:
+                self.bytes_written = os.fstat(self.stream.fileno()).st_size
+        finally:
+            self.release()
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            size = len(msg.encode(self.stream.encoding, "replace"))
+            if self.maxBytes > 0 and self.bytes_written and self.bytes_written + size >= self.maxBytes:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(msg)
+            self.bytes_written += size
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class BatchingQueueListener(QueueListener):
+    """QueueListener that flushes its handlers whenever it has drained the queue."""
+
+    def dequeue(self, block):
+        try:
+            return self.queue.get(block=False)
+        except queue.Empty:
+            for handler in self.handlers:
+                handler.flush()
+            return self.queue.get(block)
+
+
 # Configure logging with both console and file handlers
 def setup_logging():
-    """Setup logging with file persistence and rotation."""
+    """
+    Setup logging with file persistence and rotation.
+
+    Log records are put on a queue and written by a background
+    QueueListener thread, so logging calls never block on disk I/O.
+    The listener flushes the log files once per drained batch of records.
+
+    Safe to call more than once: if the root logger is already set up
+    (e.g. the module is imported twice), no handlers are added.
+    """
     log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
     # Root logger configuration
     root_logger = logging.getLogger()
+    if any(isinstance(h, QueueHandler) for h in root_logger.handlers):
+        return logging.getLogger(__name__)
     root_logger.setLevel(getattr(logging, LOG_LEVEL.upper(), logging.INFO))
 
-    # Console handler - use stderr for gunicorn compatibility
+    # Console handler - use stderr so hypercorn and kubectl logs capture it
     console_handler = logging.StreamHandler(sys.stderr)
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(logging.Formatter(log_format))
-    root_logger.addHandler(console_handler)
-
-    # Also hook into gunicorn's logger if available
-    gunicorn_logger = logging.getLogger('gunicorn.error')
-    if gunicorn_logger.handlers:
-        root_logger.handlers = gunicorn_logger.handlers
-        root_logger.setLevel(gunicorn_logger.level)
 
     # File handler with rotation (10MB max, keep 5 backups)
-    file_handler = RotatingFileHandler(
+    file_handler = BatchingRotatingFileHandler(
         os.path.join(LOG_DIR, 'orchestrator.log'),
         maxBytes=10*1024*1024,  # 10MB
         backupCount=5
     )
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(logging.Formatter(log_format))
-    root_logger.addHandler(file_handler)
 
     # Error-specific file handler for easy error investigation
-    error_handler = RotatingFileHandler(
+    error_handler = BatchingRotatingFileHandler(
         os.path.join(LOG_DIR, 'orchestrator-errors.log'),
         maxBytes=10*1024*1024,  # 10MB
         backupCount=5
     )
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(logging.Formatter(log_format))
-    root_logger.addHandler(error_handler)
+
+    # Only the queue handler is attached to the root logger; the listener
+    # thread drains the queue into the real handlers
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(QueueHandler(log_queue))
+    listener = BatchingQueueListener(
+        log_queue, console_handler, file_handler, error_handler,
+        respect_handler_level=True
+    )
+    listener.start()
+    # Flush records still on the queue when the worker exits
+    atexit.register(listener.stop)
 
     return logging.getLogger(__name__)
 
 logger = setup_logging()
 
-app = Flask(__name__)
+app = Quart(__name__)
+# Orchestrations and their event streams can run for many minutes
+app.config["RESPONSE_TIMEOUT"] = None
+
+
+def json_response(payload: Any, status: int = 200) -> Response:
+    """
+    Create a JSON response serialized with orjson.
+
+    Args:
+        payload: JSON-serializable object
+        status: HTTP status code
+
+    Returns:
+        Quart response with application/json body
+    """
+    return app.response_class(orjson.dumps(payload), status=status, mimetype="application/json")
 
 # Configuration from environment
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
@@ -78,10 +172,123 @@ ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 WORKSPACE_PATH = os.getenv("WORKSPACE_PATH", "/mnt/claude-workspace")
 # WORKSPACE_LOCAL is where the workspace is mounted inside this container
 WORKSPACE_LOCAL = os.getenv("WORKSPACE_LOCAL", "/workspace")
+# Workspace with symlinks resolved, for path containment checks
+_WORKSPACE_ROOT = os.path.realpath(WORKSPACE_LOCAL)
 DOCKER_MCP_IMAGE = os.getenv("DOCKER_MCP_IMAGE", "claude-mcp:latest")
+DOCKER_SOCKET = "/var/run/docker.sock"
+# Optional URL of a shared, long-lived MCP server (HTTP transport).
+# When set, agents connect to it instead of starting a container each.
+MCP_SERVER_URL = os.getenv("MCP_SERVER_URL")
+# Only connect the MCP server configured here; don't let each agent's CLI
+# start additional MCP servers from user or project settings
+MCP_CLI_ARGS = {"strict-mcp-config": None}
+# Start one long-lived MCP container per agent and attach to it with docker exec
+MCP_AGENT_CONTAINERS = os.getenv("MCP_AGENT_CONTAINERS", "false").lower() == "true"
+# Maximum number of concurrent agent sessions on the shared MCP server
+MCP_SERVER_MAX_SESSIONS = int(os.getenv("MCP_SERVER_MAX_SESSIONS", "10"))
+
+# Maximum number of agents of one orchestration running at the same time
+MAX_CONCURRENT_AGENTS = int(os.getenv("MAX_CONCURRENT_AGENTS", "10"))
+
+# Maximum characters of an agent's output and error returned in responses;
+# the full output stays available from the run directory
+MAX_OUTPUT_CHARS = 64 * 1024
+# Maximum characters of a traceback returned in responses (the end is kept)
+MAX_TRACEBACK_CHARS = 8 * 1024
+
+# Maximum number of intermediate messages kept per agent
+MAX_AGENT_MESSAGES = 100
+# Maximum characters of content kept per captured message
+MESSAGE_PREVIEW_CHARS = 500
+
+# Maximum number of files returned by /workspace
+MAX_LISTED_FILES = 100
+# Stat listed files from a thread pool; pays off when the workspace is a
+# network filesystem where every stat is a round-trip
+WORKSPACE_PARALLEL_STAT = os.getenv("WORKSPACE_PARALLEL_STAT", "false").lower() in ("1", "true")
+
+# Run IDs double as background task IDs
+RUN_ID_TIME_FORMAT = "%Y%m%d_%H%M%S"
+RUN_ID_PATTERN = re.compile(r"[0-9]{8}_[0-9]{6}_[0-9a-f]{8}")
+
+# UTC timestamps in diagnostics, workspace listings and task status
+ISO_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# A running background task refreshes the mtime of its status file this often
+TASK_HEARTBEAT_INTERVAL = 30
+# A running task without a heartbeat for this many seconds has no live owner
+# (its orchestrator pod died) and is reported as stale
+TASK_STALE_AFTER = float(os.getenv("TASK_STALE_AFTER", "120"))
+
+# Docker pre-flight results are shared between agents for this many seconds
+DOCKER_CHECK_TTL = float(os.getenv("DOCKER_CHECK_TTL", "30"))
+_docker_check_cache = {"ts": 0.0, "value": None}
+_docker_check_lock = asyncio.Lock()
+
+
+# Pool of session slots on the shared MCP server
+mcp_session_pool = asyncio.Semaphore(MCP_SERVER_MAX_SESSIONS)
+
+# Threads for parallel stats in /workspace (None if disabled)
+stat_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="stat") if WORKSPACE_PARALLEL_STAT else None
+
+
+async def docker_api_get(path: str, timeout: float = 10) -> Tuple[int, bytes]:
+    """
+    Send a GET request to the Docker Engine API over the Docker socket.
+
+    Uses HTTP/1.0 so the daemon closes the connection after responding
+    and the whole response can be read until EOF.
+
+    Args:
+        path: API path, e.g. "/_ping"
+        timeout: Seconds to wait for the complete response
+
+    Returns:
+        Tuple of (HTTP status code, response body)
+    """
+    async def request_once() -> bytes:
+        reader, writer = await asyncio.open_unix_connection(DOCKER_SOCKET)
+        try:
+            writer.write(f"GET {path} HTTP/1.0\r\nHost: localhost\r\n\r\n".encode())
+            await writer.drain()
+            return await reader.read()
+        finally:
+            writer.close()
+
+    response = await asyncio.wait_for(request_once(), timeout)
+    status_line, _, rest = response.partition(b"\r\n")
+    body = rest.partition(b"\r\n\r\n")[2]
+    return int(status_line.split()[1]), body
+
+
+async def run_docker_cli(*args: str, timeout: float = 10) -> Tuple[bool, str]:
+    """
+    Run a docker CLI command without blocking the event loop.
+
+    Args:
+        *args: Arguments passed to the docker CLI
+        timeout: Seconds to wait for the command to finish
+
+    Returns:
+        Tuple of (exit code was 0, stdout on success or stderr on failure)
+    """
+    proc = await asyncio.create_subprocess_exec(
+        "docker", *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return False, f"docker {args[0]} timed out after {timeout} seconds"
+    ok = proc.returncode == 0
+    return ok, (stdout if ok else stderr).decode(errors="replace").strip()
 
 
-def check_docker_available() -> Dict[str, Any]:
+async def check_docker_available() -> Dict[str, Any]:
     """Check if Docker is available and accessible."""
     result = {
         "docker_cli": False,
@@ -91,52 +298,99 @@ def check_docker_available() -> Dict[str, Any]:
         "errors": []
     }
 
-    # Check if docker CLI exists
+    # Check if docker CLI exists (needed to launch MCP containers)
     docker_path = shutil.which("docker")
     result["docker_cli"] = docker_path is not None
     result["docker_cli_path"] = docker_path
+    if not result["docker_cli"]:
+        result["errors"].append("docker CLI not found")
 
     # Check if Docker socket exists
-    socket_path = "/var/run/docker.sock"
-    result["docker_socket"] = os.path.exists(socket_path)
-    result["docker_socket_path"] = socket_path
+    result["docker_socket"] = os.path.exists(DOCKER_SOCKET)
+    result["docker_socket_path"] = DOCKER_SOCKET
 
-    # Try to run docker info
-    if result["docker_cli"]:
+    # Ping the daemon directly over the socket
+    if result["docker_socket"]:
         try:
-            proc = subprocess.run(
-                ["docker", "info"],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            result["docker_running"] = proc.returncode == 0
-            if proc.returncode != 0:
-                result["errors"].append(f"docker info failed: {proc.stderr}")
-        except subprocess.TimeoutExpired:
-            result["errors"].append("docker info timed out")
-        except Exception as e:
-            result["errors"].append(f"docker info error: {str(e)}")
+            status, body = await docker_api_get("/_ping")
+            result["docker_running"] = status == 200
+            if status != 200:
+                result["errors"].append(f"docker ping failed: HTTP {status} {body.decode(errors='replace')}")
+        except (OSError, ValueError, IndexError) as e:
+            result["errors"].append(f"docker ping error: {str(e)}")
+    elif result["docker_cli"]:
+        # No local socket (e.g. Docker Desktop or DOCKER_HOST in development):
+        # fall back to asking the CLI, which knows how to reach the daemon
+        try:
+            ok, error = await run_docker_cli("info", "--format", "{{.ServerVersion}}")
+            result["docker_running"] = ok
+            if ok:
+                ok, error = await run_docker_cli("image", "inspect", "--format", "{{.Id}}", DOCKER_MCP_IMAGE)
+                result["mcp_image_exists"] = ok
+                result["mcp_image_name"] = DOCKER_MCP_IMAGE
+                if not ok:
+                    result["errors"].append(f"MCP image '{DOCKER_MCP_IMAGE}' not found")
+            else:
+                result["errors"].append(f"docker info failed: {error}")
+        except OSError as e:
+            result["errors"].append(f"docker CLI error: {str(e)}")
+    else:
+        result["errors"].append(f"Docker socket not found at {DOCKER_SOCKET}")
 
     # Check if MCP image exists
-    if result["docker_running"]:
+    if result["docker_running"] and result["docker_socket"]:
         try:
-            proc = subprocess.run(
-                ["docker", "images", "-q", DOCKER_MCP_IMAGE],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            result["mcp_image_exists"] = bool(proc.stdout.strip())
+            status, body = await docker_api_get(f"/images/{quote(DOCKER_MCP_IMAGE, safe='/:')}/json")
+            result["mcp_image_exists"] = status == 200
             result["mcp_image_name"] = DOCKER_MCP_IMAGE
-            if not result["mcp_image_exists"]:
+            if status == 404:
                 result["errors"].append(f"MCP image '{DOCKER_MCP_IMAGE}' not found")
-        except Exception as e:
-            result["errors"].append(f"docker images error: {str(e)}")
+            elif status != 200:
+                result["errors"].append(f"docker image inspect failed: HTTP {status} {body.decode(errors='replace')}")
+        except (OSError, ValueError, IndexError) as e:
+            result["errors"].append(f"docker image inspect error: {str(e)}")
 
     return result
 
 
+async def refresh_docker_status() -> Dict[str, Any]:
+    """
+    Run the Docker pre-flight check and store the result in the cache.
+
+    Returns:
+        Result of check_docker_available()
+    """
+    value = await check_docker_available()
+    _docker_check_cache["value"] = value
+    _docker_check_cache["ts"] = time.monotonic()
+    return value
+
+
+async def get_docker_status() -> Dict[str, Any]:
+    """
+    Get the Docker pre-flight check result, cached for DOCKER_CHECK_TTL seconds.
+
+    Returns:
+        Result of check_docker_available(), possibly from cache
+    """
+    if _docker_check_cache["value"] is None or time.monotonic() - _docker_check_cache["ts"] >= DOCKER_CHECK_TTL:
+        # Let one caller probe the daemon while concurrent callers wait for its result
+        async with _docker_check_lock:
+            if _docker_check_cache["value"] is None or time.monotonic() - _docker_check_cache["ts"] >= DOCKER_CHECK_TTL:
+                return await refresh_docker_status()
+    return _docker_check_cache["value"]
+
+
+async def keep_docker_status_fresh() -> None:
+    """Refresh the cached Docker status in the background so probes never wait on it."""
+    while True:
+        try:
+            await refresh_docker_status()
+        except Exception as e:
+            logger.error("Background Docker status refresh failed: %s", e)
+        await asyncio.sleep(DOCKER_CHECK_TTL / 2)
+
+
 def create_run_directory(run_id: str) -> str:
     """
     Create a directory for the current run.
@@ -152,168 +406,124 @@ def create_run_directory(run_id: str) -> str:
 
     # Create the directory
     os.makedirs(run_dir_local, exist_ok=True)
-    logger.info(f"Created run directory: {run_dir_local}")
+    logger.info("Created run directory: %s", run_dir_local)
 
     return os.path.join("runs", run_dir_name)
 
 
-def init_git_repo(run_dir_rel: str) -> bool:
+# Initializes the run repository and adds one branch and worktree per agent.
+# Takes the agent count as $1; a failed worktree is reported on stderr and
+# skipped so that the remaining agents still get theirs.
+GIT_SETUP_SCRIPT = """
+set -e
+git init -q
+git config user.email agent@claude-mcp.local
+git config user.name "Claude Agent"
+git add README.md
+git commit -q -m "Initial commit"
+mkdir -p worktrees
+for i in $(seq 1 "$1"); do
+    git worktree add -q -b "agent-$i" "worktrees/agent-$i" || echo "worktree agent-$i failed" >&2
+done
+"""
+
+
+async def init_git_workspace(run_dir_rel: str, agent_count: int) -> bool:
     """
-    Initialize a git repository for the run.
+    Initialize the run's git repository and create the agent worktrees in one shell call.
 
     Args:
         run_dir_rel: Relative path to run directory from workspace
+        agent_count: Number of agents to create worktrees for
 
     Returns:
-        True if successful, False otherwise
+        True if the repository was initialized, False otherwise
     """
     run_dir_local = os.path.join(WORKSPACE_LOCAL, run_dir_rel)
 
     try:
-        # Initialize git repo
-        result = subprocess.run(
-            ["git", "init"],
-            cwd=run_dir_local,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        if result.returncode != 0:
-            logger.error(f"Git init failed: {result.stderr}")
-            return False
-
-        # Configure git user for commits
-        subprocess.run(
-            ["git", "config", "user.email", "agent@claude-mcp.local"],
-            cwd=run_dir_local,
-            capture_output=True,
-            timeout=10
-        )
-        subprocess.run(
-            ["git", "config", "user.name", "Claude Agent"],
-            cwd=run_dir_local,
-            capture_output=True,
-            timeout=10
-        )
-
-        # Create initial commit
+        # Initial commit content
         readme_path = os.path.join(run_dir_local, "README.md")
         with open(readme_path, "w") as f:
             f.write(f"# Run {run_dir_rel}\n\nCreated at: {datetime.now().isoformat()}\n")
 
-        subprocess.run(
-            ["git", "add", "README.md"],
-            cwd=run_dir_local,
-            capture_output=True,
-            timeout=10
-        )
-        subprocess.run(
-            ["git", "commit", "-m", "Initial commit"],
+        proc = await asyncio.create_subprocess_exec(
+            "bash", "-c", GIT_SETUP_SCRIPT, "git-setup", str(int(agent_count)),
             cwd=run_dir_local,
-            capture_output=True,
-            timeout=10
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
         )
+        try:
+            _, stderr = await asyncio.wait_for(proc.communicate(), timeout=30 + 10 * agent_count)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            logger.error("Git setup in %s timed out", run_dir_local)
+            return False
 
-        logger.info(f"Initialized git repo in {run_dir_local}")
+        if stderr:
+            logger.error("Git setup in %s reported: %s", run_dir_local, stderr.decode(errors="replace").strip())
+        if proc.returncode != 0:
+            return False
+
+        logger.info("Initialized git repo with %d worktrees in %s", agent_count, run_dir_local)
         return True
 
     except Exception as e:
-        logger.error(f"Error initializing git repo: {e}")
+        logger.error("Error initializing git repo: %s", e)
         return False
 
 
-def create_agent_worktree(run_dir_rel: str, agent_id: int) -> Tuple[str, str]:
-    """
-    Create a git worktree and branch for an agent.
-
-    Args:
-        run_dir_rel: Relative path to run directory from workspace
-        agent_id: Agent identifier
-
-    Returns:
-        Tuple of (worktree_path_rel, branch_name) relative to workspace
-    """
-    run_dir_local = os.path.join(WORKSPACE_LOCAL, run_dir_rel)
-    branch_name = f"agent-{agent_id}"
-    worktree_name = f"agent-{agent_id}"
-    worktree_path_rel = os.path.join(run_dir_rel, "worktrees", worktree_name)
-    worktree_path_local = os.path.join(WORKSPACE_LOCAL, worktree_path_rel)
-
-    try:
-        # Create worktrees directory
-        worktrees_dir = os.path.join(run_dir_local, "worktrees")
-        os.makedirs(worktrees_dir, exist_ok=True)
-
-        # Create branch
-        subprocess.run(
-            ["git", "branch", branch_name],
-            cwd=run_dir_local,
-            capture_output=True,
-            timeout=10
-        )
-
-        # Create worktree
-        result = subprocess.run(
-            ["git", "worktree", "add", worktree_path_local, branch_name],
-            cwd=run_dir_local,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-
-        if result.returncode != 0:
-            logger.error(f"Failed to create worktree: {result.stderr}")
-            # Fallback: just use a subdirectory
-            os.makedirs(worktree_path_local, exist_ok=True)
-
-        logger.info(f"Created worktree for agent {agent_id}: {worktree_path_rel} on branch {branch_name}")
-        return worktree_path_rel, branch_name
-
-    except Exception as e:
-        logger.error(f"Error creating worktree for agent {agent_id}: {e}")
-        # Fallback: create simple directory
-        os.makedirs(worktree_path_local, exist_ok=True)
-        return worktree_path_rel, branch_name
+def generate_run_id() -> str:
+    """Generate a unique run ID of the form YYYYMMDD_HHMMSS_<8 hex chars> (UTC time)."""
+    return f"{time.strftime(RUN_ID_TIME_FORMAT, time.gmtime())}_{os.urandom(4).hex()}"
 
 
-def setup_run_environment(agent_count: int) -> Dict[str, Any]:
+async def setup_run_environment(agent_count: int, run_id: str = None) -> Dict[str, Any]:
     """
     Set up the complete run environment with git repo and worktrees.
 
     Args:
         agent_count: Number of agents to create worktrees for
+        run_id: Optional pre-generated run ID
 
     Returns:
         Dictionary with run information including paths and branches
     """
     # Generate unique run ID
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    run_id = f"{timestamp}_{uuid.uuid4().hex[:8]}"
+    if run_id is None:
+        run_id = generate_run_id()
 
     # Create run directory
     run_dir_rel = create_run_directory(run_id)
 
-    # Initialize git repo
-    git_initialized = init_git_repo(run_dir_rel)
+    # Initialize git repo and create worktrees for each agent
+    git_initialized = await init_git_workspace(run_dir_rel, agent_count)
 
-    # Create worktrees for each agent
     agent_workspaces = []
     for i in range(agent_count):
         agent_id = i + 1
+        branch_name = f"agent-{agent_id}"
         if git_initialized:
-            worktree_path, branch_name = create_agent_worktree(run_dir_rel, agent_id)
+            worktree_path = os.path.join(run_dir_rel, "worktrees", branch_name)
         else:
             # Fallback without git
-            worktree_path = os.path.join(run_dir_rel, f"agent-{agent_id}")
-            os.makedirs(os.path.join(WORKSPACE_LOCAL, worktree_path), exist_ok=True)
-            branch_name = f"agent-{agent_id}"
+            worktree_path = os.path.join(run_dir_rel, branch_name)
+        # Fallback: just use a subdirectory if the worktree could not be added.
+        # The parent always exists at this point, so one mkdir is enough.
+        try:
+            os.mkdir(os.path.join(WORKSPACE_LOCAL, worktree_path))
+        except FileExistsError:
+            pass
 
         agent_workspaces.append({
             "agent_id": agent_id,
             "worktree_path": worktree_path,
             "branch_name": branch_name,
             # Path for docker run -v (host path)
-            "docker_path": os.path.join(WORKSPACE_PATH, worktree_path)
+            "docker_path": os.path.join(WORKSPACE_PATH, worktree_path),
+            # Working directory as seen by the MCP server
+            "mcp_workdir": os.path.join("/workspace", worktree_path) if MCP_SERVER_URL else "/workspace"
         })
 
     return {
@@ -324,28 +534,181 @@ def setup_run_environment(agent_count: int) -> Dict[str, Any]:
     }
 
 
-def create_agent_prompt(original_prompt: str, agent_workspace: Dict[str, Any]) -> str:
+def write_run_status(run_id: str, status: Dict[str, Any]) -> None:
     """
-    Create an enhanced prompt for an agent with git commit instructions.
+    Persist the task status of a run in its run directory.
+
+    The status lives on the shared workspace so any orchestrator replica
+    can answer status polls for the run.
 
     Args:
-        original_prompt: The original user prompt
-        agent_workspace: Workspace info for this agent
+        run_id: Unique identifier for the run
+        status: Status document to store
+    """
+    data = orjson.dumps(status)
+    run_dir_local = os.path.join(WORKSPACE_LOCAL, "runs", f"run_{run_id}")
+    os.makedirs(run_dir_local, exist_ok=True)
+    status_path = os.path.join(run_dir_local, "status.json")
+    tmp_path = f"{status_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, status_path)
+
+
+def cap_agent_result(run_dir_rel: str, result: Dict[str, Any]) -> None:
+    """
+    Truncate an agent's output, error and traceback to bounded sizes in place.
+
+    If the output is truncated, the full output is written to the run
+    directory and can be fetched from /runs/<run_id>/agent/<agent_id>/output.
+
+    Args:
+        run_dir_rel: Relative path to run directory from workspace
+        result: Result dictionary returned by run_agent
+    """
+    output = result.get("output")
+    if output and len(output) > MAX_OUTPUT_CHARS:
+        results_dir = os.path.join(WORKSPACE_LOCAL, run_dir_rel, "results")
+        try:
+            os.makedirs(results_dir, exist_ok=True)
+            with open(os.path.join(results_dir, f"agent-{result['agent_id']}.output.txt"), "w") as f:
+                f.write(output)
+        except Exception as e:
+            logger.error("Error saving output for agent %s: %s", result.get("agent_id"), e)
+        result["output"] = f"{output[:MAX_OUTPUT_CHARS]}\n...[truncated {len(output) - MAX_OUTPUT_CHARS} characters]"
+        result["output_truncated"] = True
+
+    error = result.get("error")
+    if error and len(error) > MAX_OUTPUT_CHARS:
+        result["error"] = f"{error[:MAX_OUTPUT_CHARS]}\n...[truncated {len(error) - MAX_OUTPUT_CHARS} characters]"
+
+    tb = result.get("traceback")
+    if tb and len(tb) > MAX_TRACEBACK_CHARS:
+        result["traceback"] = f"...[truncated {len(tb) - MAX_TRACEBACK_CHARS} characters]\n{tb[-MAX_TRACEBACK_CHARS:]}"
+
+
+def save_agent_result(run_dir_rel: str, result: Dict[str, Any]) -> None:
+    """
+    Persist a finished agent's result so partial progress can be polled.
+
+    Args:
+        run_dir_rel: Relative path to run directory from workspace
+        result: Result dictionary returned by run_agent
+    """
+    results_dir = os.path.join(WORKSPACE_LOCAL, run_dir_rel, "results")
+    try:
+        # Serialize before touching the file and swap it in atomically, so
+        # status polls never read an empty or half-written result
+        data = orjson.dumps(result)
+        os.makedirs(results_dir, exist_ok=True)
+        result_path = os.path.join(results_dir, f"agent-{result['agent_id']}.json")
+        tmp_path = f"{result_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, result_path)
+    except Exception as e:
+        logger.error("Error saving result for agent %s: %s", result.get("agent_id"), e)
+
+
+def load_run_status(run_id: str) -> Dict[str, Any]:
+    """
+    Load the task status of a run together with all agent results saved so far.
+
+    Args:
+        run_id: Unique identifier for the run
 
     Returns:
-        Enhanced prompt with system instructions
+        Status dictionary, or None if the run does not exist. Running tasks
+        carry a 'stale' flag, true once their owner stopped sending heartbeats.
     """
-    agent_id = agent_workspace["agent_id"]
-    branch_name = agent_workspace["branch_name"]
+    run_dir_local = os.path.join(WORKSPACE_LOCAL, "runs", f"run_{run_id}")
+    status_path = os.path.join(run_dir_local, "status.json")
+    try:
+        heartbeat = os.stat(status_path).st_mtime
+    except FileNotFoundError:
+        return None
+
+    with open(status_path, "rb") as f:
+        status = orjson.loads(f.read())
+
+    if status.get("status") == "running":
+        status["stale"] = time.time() - heartbeat > TASK_STALE_AFTER
+
+    if "results" not in status:
+        results = []
+        results_dir = os.path.join(run_dir_local, "results")
+        if os.path.isdir(results_dir):
+            for name in os.listdir(results_dir):
+                if name.endswith(".json"):
+                    with open(os.path.join(results_dir, name), "rb") as f:
+                        results.append(orjson.loads(f.read()))
+        status["results"] = sorted(results, key=lambda r: r["agent_id"])
+
+    return status
+
+
+def load_agent_output(run_id: str, agent_id: int) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Locate the full output of an agent.
+
+    Args:
+        run_id: Unique identifier for the run
+        agent_id: Agent whose output is requested
+
+    Returns:
+        (path of the saved full output, None) if the output was truncated in
+        responses, (None, output) if it was small enough to be stored with the
+        result, or (None, None) if the agent has no result
+    """
+    results_dir = os.path.join(WORKSPACE_LOCAL, "runs", f"run_{run_id}", "results")
+    output_path = os.path.join(results_dir, f"agent-{agent_id}.output.txt")
+    if os.path.exists(output_path):
+        return output_path, None
+
+    result_path = os.path.join(results_dir, f"agent-{agent_id}.json")
+    try:
+        with open(result_path, "rb") as f:
+            result = orjson.loads(f.read())
+    except FileNotFoundError:
+        return None, None
+    return None, result.get("output") or ""
+
+
+def summarize_results(results: List[Dict[str, Any]], agent_count: int) -> Dict[str, int]:
+    """
+    Count successful and failed agents.
 
-    system_instructions = f"""
+    Args:
+        results: Agent result dictionaries
+        agent_count: Number of agents requested
+
+    Returns:
+        Summary dictionary with total, successful and failed counts
+    """
+    success_count = error_count = 0
+    for r in results:
+        status = r.get("status")
+        if status == "success":
+            success_count += 1
+        elif status == "error":
+            error_count += 1
+
+    return {
+        "total_agents": agent_count,
+        "successful": success_count,
+        "failed": error_count
+    }
+
+
+# Instructions prepended to each agent's task; filled in by create_agent_prompt
+AGENT_PROMPT_TEMPLATE = """
 ## IMPORTANT: Workspace and Git Instructions
 
-You are Agent {agent_id} working on branch `{branch_name}`.
+You are Agent %(agent_id)s working on branch `%(branch_name)s`.
 
-**Your working directory is: /workspace**
+**Your working directory is: %(workdir)s**
 
-All files you create should be placed in /workspace.
+All files you create should be placed in %(workdir)s.
 
 **CRITICAL: At the end of your work, you MUST commit all your changes:**
 
@@ -356,7 +719,7 @@ All files you create should be placed in /workspace.
 
 2. Commit with a descriptive message:
    ```bash
-   git commit -m "Agent {agent_id}: <brief description of what you implemented>"
+   git commit -m "Agent %(agent_id)s: <brief description of what you implemented>"
    ```
 
 Make sure to commit ALL files you created or modified before finishing.
@@ -365,69 +728,182 @@ Make sure to commit ALL files you created or modified before finishing.
 
 ## Your Task:
 
-{original_prompt}
+%(original_prompt)s
 """
 
-    return system_instructions
 
-
-def get_mcp_options_for_agent(agent_workspace: Dict[str, Any]) -> ClaudeAgentOptions:
+def create_agent_prompt(original_prompt: str, agent_workspace: Dict[str, Any]) -> str:
     """
-    Create ClaudeAgentOptions with MCP server configuration for a specific agent.
+    Create an enhanced prompt for an agent with git commit instructions.
 
     Args:
-        agent_workspace: Workspace configuration for this agent
+        original_prompt: The original user prompt
+        agent_workspace: Workspace info for this agent
 
     Returns:
-        ClaudeAgentOptions configured for the agent's worktree
+        Enhanced prompt with system instructions
+    """
+    return AGENT_PROMPT_TEMPLATE % {
+        "agent_id": agent_workspace["agent_id"],
+        "branch_name": agent_workspace["branch_name"],
+        "workdir": agent_workspace.get("mcp_workdir", "/workspace"),
+        "original_prompt": original_prompt
+    }
+
+
+# Parts of the per-agent MCP server command that don't depend on the agent
+_MCP_SERVE_COMMAND = ("claude", "mcp", "serve")
+_MCP_ARGS_PREFIX = ("run", "-i", "--rm", "-v")
+_MCP_ARGS_SUFFIX = (DOCKER_MCP_IMAGE, *_MCP_SERVE_COMMAND)
+_MCP_ENV = {"ANTHROPIC_API_KEY": ANTHROPIC_API_KEY}
+
+
+def build_docker_mcp_options(docker_args: List[str]) -> ClaudeAgentOptions:
     """
-    docker_path = agent_workspace["docker_path"]
+    Create ClaudeAgentOptions for an MCP server launched through the docker CLI.
+
+    Args:
+        docker_args: Arguments for the docker CLI that start the MCP server on stdio
 
+    Returns:
+        ClaudeAgentOptions launching the MCP server via docker
+    """
     return ClaudeAgentOptions(
         mcp_servers={
             "claude-code-docker": {
                 "type": "stdio",
                 "command": "docker",
-                "args": [
-                    "run", "-i", "--rm",
-                    "-v", f"{docker_path}:/workspace",
-                    DOCKER_MCP_IMAGE,
-                    "claude", "mcp", "serve"
-                ],
-                "env": {
-                    "ANTHROPIC_API_KEY": ANTHROPIC_API_KEY
-                }
+                "args": docker_args,
+                "env": _MCP_ENV
             }
         },
-        allowed_tools=["mcp__claude-code-docker__*"]
+        allowed_tools=["mcp__claude-code-docker__*"],
+        extra_args=MCP_CLI_ARGS
     )
 
 
+def get_mcp_options_for_agent(agent_workspace: Dict[str, Any]) -> ClaudeAgentOptions:
+    """
+    Create ClaudeAgentOptions with MCP server configuration for a specific agent.
+
+    Args:
+        agent_workspace: Workspace configuration for this agent
+
+    Returns:
+        ClaudeAgentOptions configured for the agent's worktree
+    """
+    if MCP_SERVER_URL:
+        return get_shared_mcp_options()
+
+    container_id = agent_workspace.get("container_id")
+    if container_id:
+        # Attach to the agent's already running container
+        return build_docker_mcp_options(["exec", "-i", container_id, *_MCP_SERVE_COMMAND])
+
+    return build_docker_mcp_options(
+        [*_MCP_ARGS_PREFIX, f"{agent_workspace['docker_path']}:/workspace", *_MCP_ARGS_SUFFIX]
+    )
+
+
+@functools.lru_cache(maxsize=1)
 def get_mcp_options() -> ClaudeAgentOptions:
     """
     Create ClaudeAgentOptions with MCP server configuration (legacy, uses root workspace).
+
+    The configuration only depends on environment settings, so it is built
+    once per process and shared by all agents.
+    """
+    if MCP_SERVER_URL:
+        return get_shared_mcp_options()
+
+    return build_docker_mcp_options([*_MCP_ARGS_PREFIX, f"{WORKSPACE_PATH}:/workspace", *_MCP_ARGS_SUFFIX])
+
+
+@functools.lru_cache(maxsize=1)
+def get_shared_mcp_options() -> ClaudeAgentOptions:
+    """
+    Create ClaudeAgentOptions for the shared MCP server at MCP_SERVER_URL.
     """
     return ClaudeAgentOptions(
         mcp_servers={
             "claude-code-docker": {
-                "type": "stdio",
-                "command": "docker",
-                "args": [
-                    "run", "-i", "--rm",
-                    "-v", f"{WORKSPACE_PATH}:/workspace",
-                    DOCKER_MCP_IMAGE,
-                    "claude", "mcp", "serve"
-                ],
-                "env": {
-                    "ANTHROPIC_API_KEY": ANTHROPIC_API_KEY
-                }
+                "type": "http",
+                "url": MCP_SERVER_URL
             }
         },
-        allowed_tools=["mcp__claude-code-docker__*"]
+        allowed_tools=["mcp__claude-code-docker__*"],
+        extra_args=MCP_CLI_ARGS
     )
 
 
-async def run_agent(agent_id: int, prompt: str, agent_workspace: Dict[str, Any] = None) -> Dict[str, Any]:
+async def start_agent_container(run_id: str, agent_workspace: Dict[str, Any]) -> str:
+    """
+    Start a long-lived MCP container with the agent's worktree mounted at /workspace.
+
+    The MCP server is later started inside it with docker exec, so the
+    container is created before the agent runs instead of by the agent's CLI.
+
+    Args:
+        run_id: Unique identifier for this run
+        agent_workspace: Workspace configuration for this agent
+
+    Returns:
+        The container ID, or None if the container could not be started
+    """
+    agent_id = agent_workspace["agent_id"]
+    ok, output = await run_docker_cli(
+        "run", "-d", "--rm",
+        "--name", f"mcp_{run_id}_{agent_id}",
+        "--label", f"claude-mcp.run={run_id}",
+        "-e", "ANTHROPIC_API_KEY",
+        "-v", f"{agent_workspace['docker_path']}:/workspace",
+        DOCKER_MCP_IMAGE,
+        "tail", "-f", "/dev/null",
+        timeout=60
+    )
+    if not ok:
+        logger.error("Agent %d: Failed to start MCP container: %s", agent_id, output)
+        return None
+
+    logger.info("Agent %d: Started MCP container %.12s", agent_id, output)
+    return output
+
+
+async def remove_agent_container(container_id: str) -> None:
+    """
+    Stop and remove an agent's MCP container.
+
+    Args:
+        container_id: ID of the container started by start_agent_container
+    """
+    ok, output = await run_docker_cli("rm", "-f", container_id, timeout=30)
+    if not ok:
+        logger.error("Failed to remove MCP container %.12s: %s", container_id, output)
+
+
+def summarize_message(message: Any) -> Dict[str, str]:
+    """
+    Build a compact record of an intermediate SDK message.
+
+    Args:
+        message: Message received from the agent stream
+
+    Returns:
+        Dictionary with the message type and a truncated content preview
+    """
+    content = getattr(message, "content", None)
+    if content is None:
+        content = getattr(message, "data", message)
+    if not isinstance(content, str):
+        content = str(content)
+    return {
+        "type": type(message).__name__,
+        "content": content[:MESSAGE_PREVIEW_CHARS]
+    }
+
+
+async def run_agent(agent_id: int, prompt: str, agent_workspace: Dict[str, Any] = None,
+                    docker_check: Dict[str, Any] = None, verbose: bool = False) -> Dict[str, Any]:
     """
     Run a single Claude agent with the given prompt.
 
@@ -435,17 +911,24 @@ async def run_agent(agent_id: int, prompt: str, agent_workspace: Dict[str, Any]
         agent_id: Identifier for this agent instance
         prompt: The prompt to send to the agent
         agent_workspace: Optional workspace configuration for git workflow
+        docker_check: Optional Docker pre-flight result shared across agents
+        verbose: If true, capture intermediate messages in the result
 
     Returns:
         Dictionary with agent results
     """
-    logger.info(f"Agent {agent_id}: Starting with prompt: {prompt[:50]}...")
+    logger.info("Agent %d: Starting with prompt: %.50s...", agent_id, prompt)
 
+    # Captured messages are buffered here; the result only ever holds a
+    # list, so it stays JSON-serializable on every return path
+    messages = collections.deque(maxlen=MAX_AGENT_MESSAGES)
     result = {
         "agent_id": agent_id,
         "status": "pending",
         "output": "",
-        "messages": []
+        "messages": [],
+        # Number of captured messages dropped from the front of the buffer
+        "messages_truncated": 0
     }
 
     # Add workspace info to result if available
@@ -455,21 +938,23 @@ async def run_agent(agent_id: int, prompt: str, agent_workspace: Dict[str, Any]
             "branch_name": agent_workspace.get("branch_name")
         }
 
-    # Pre-flight check: verify Docker is available
-    docker_check = check_docker_available()
-    if not docker_check["docker_running"]:
-        result["status"] = "error"
-        result["error"] = "Docker is not available or not running"
-        result["docker_diagnostics"] = docker_check
-        logger.error(f"Agent {agent_id}: Docker not available - {docker_check['errors']}")
-        return result
-
-    if not docker_check["mcp_image_exists"]:
-        result["status"] = "error"
-        result["error"] = f"MCP image '{DOCKER_MCP_IMAGE}' not found. Please build it first."
-        result["docker_diagnostics"] = docker_check
-        logger.error(f"Agent {agent_id}: MCP image not found")
-        return result
+    # Pre-flight check: verify Docker is available (not needed for a shared MCP server)
+    if not MCP_SERVER_URL:
+        if docker_check is None:
+            docker_check = await get_docker_status()
+        if not (docker_check["docker_cli"] and docker_check["docker_running"]):
+            result["status"] = "error"
+            result["error"] = "Docker is not available or not running"
+            result["docker_diagnostics"] = docker_check
+            logger.error("Agent %d: Docker not available - %s", agent_id, docker_check["errors"])
+            return result
+
+        if not docker_check["mcp_image_exists"]:
+            result["status"] = "error"
+            result["error"] = f"MCP image '{DOCKER_MCP_IMAGE}' not found. Please build it first."
+            result["docker_diagnostics"] = docker_check
+            logger.error("Agent %d: MCP image not found", agent_id)
+            return result
 
     try:
         # Use agent-specific workspace if provided, otherwise use default
@@ -479,93 +964,131 @@ async def run_agent(agent_id: int, prompt: str, agent_workspace: Dict[str, Any]
         else:
             options = get_mcp_options()
             workspace_path = WORKSPACE_PATH
-        logger.info(f"Agent {agent_id}: MCP options configured - image: {DOCKER_MCP_IMAGE}, workspace: {workspace_path}")
-
-        async for message in query(prompt=prompt, options=options):
-            # Log message type for debugging
-            message_type = type(message).__name__
-            logger.debug(f"Agent {agent_id}: Received message type: {message_type}")
-            logger.debug(f"Agent {agent_id}: Message content: {str(message)[:200]}")
-
-            if isinstance(message, ResultMessage):
-                if message.subtype == "success":
-                    result["status"] = "success"
-                    result["output"] = message.result
-                    logger.info(f"Agent {agent_id}: Completed successfully")
-                elif message.subtype == "error":
-                    result["status"] = "error"
-                    result["error"] = message.result
-                    # Log API errors with full details for investigation
-                    error_details = {
-                        "agent_id": agent_id,
-                        "error_message": message.result,
-                        "timestamp": datetime.now().isoformat(),
-                        "workspace": workspace_path
-                    }
-                    logger.error(f"Agent {agent_id}: API/SDK Error - {message.result}")
-                    logger.error(f"Agent {agent_id}: Error details: {json.dumps(error_details)}")
-            else:
-                # Capture other message types
-                result["messages"].append(str(message))
-                logger.debug(f"Agent {agent_id}: Other message - {str(message)[:100]}")
+        if MCP_SERVER_URL:
+            logger.info("Agent %d: MCP options configured - shared server: %s", agent_id, MCP_SERVER_URL)
+            session_slot = mcp_session_pool
+        else:
+            logger.info("Agent %d: MCP options configured - image: %s, workspace: %s",
+                        agent_id, DOCKER_MCP_IMAGE, workspace_path)
+            session_slot = contextlib.nullcontext()
+
+        # Skip building per-message debug strings unless DEBUG is enabled
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+
+        async with session_slot:
+            async for message in query(prompt=prompt, options=options):
+                # Log message type and content for debugging (stringifies the message once)
+                if debug_enabled:
+                    logger.debug("Agent %d: Received %s message: %.200s", agent_id, type(message).__name__, message)
+
+                if isinstance(message, ResultMessage):
+                    if message.subtype == "success":
+                        result["status"] = "success"
+                        result["output"] = message.result
+                        logger.info("Agent %d: Completed successfully", agent_id)
+                    elif message.subtype == "error":
+                        result["status"] = "error"
+                        result["error"] = message.result
+                        # Log API errors with full details for investigation
+                        error_details = {
+                            "agent_id": agent_id,
+                            "error_message": message.result,
+                            "timestamp": datetime.now().isoformat(),
+                            "workspace": workspace_path
+                        }
+                        logger.error("Agent %d: API/SDK Error - %s", agent_id, message.result)
+                        logger.error("Agent %d: Error details: %s", agent_id, error_details)
+                else:
+                    # Capture other message types only when requested
+                    if verbose:
+                        if len(messages) == MAX_AGENT_MESSAGES:
+                            result["messages_truncated"] += 1
+                        messages.append(summarize_message(message))
 
     except Exception as e:
         result["status"] = "error"
+        tb = traceback.format_exc()
         result["error"] = str(e)
-        result["traceback"] = traceback.format_exc()
-        logger.error(f"Agent {agent_id}: Exception - {e}")
-        logger.error(f"Agent {agent_id}: Traceback:\n{traceback.format_exc()}")
+        result["traceback"] = tb
+        logger.error("Agent %d: Exception - %s", agent_id, e)
+        logger.error("Agent %d: Traceback:\n%s", agent_id, tb)
 
+    result["messages"] = list(messages)
     return result
 
 
-async def orchestrate_agents(prompt: str, agent_count: int) -> Dict[str, Any]:
+async def orchestrate_agents(prompt: str, agent_count: int, run_id: str = None,
+                             on_result: Callable[[Dict[str, Any]], None] = None,
+                             verbose: bool = False) -> Dict[str, Any]:
     """
     Orchestrate multiple agents to work on the same prompt concurrently.
 
     Sets up a git repository with worktrees for each agent and adds
-    commit instructions to their prompts.
+    commit instructions to their prompts. Each agent's result is saved
+    to the run directory as soon as it finishes.
 
     Args:
         prompt: The prompt to send to all agents
         agent_count: Number of agents to spawn
+        run_id: Optional pre-generated run ID
+        on_result: Optional callback invoked with each agent's result as it finishes
+        verbose: If true, capture intermediate messages in each agent's result
 
     Returns:
         Dictionary with run info and results from all agents
     """
-    logger.info(f"Orchestrating {agent_count} agents for prompt: {prompt[:50]}...")
+    logger.info("Orchestrating %d agents for prompt: %.50s...", agent_count, prompt)
+
+    # Run the Docker pre-flight check once and share it with all agents
+    docker_check = None if MCP_SERVER_URL else await get_docker_status()
 
     # Set up the run environment with git repo and worktrees
-    run_env = setup_run_environment(agent_count)
-    logger.info(f"Created run environment: {run_env['run_id']} with {len(run_env['agent_workspaces'])} worktrees")
+    run_env = await setup_run_environment(agent_count, run_id)
+    logger.info("Created run environment: %s with %d worktrees",
+                run_env["run_id"], len(run_env["agent_workspaces"]))
 
-    # Create tasks for all agents with their specific workspaces and enhanced prompts
-    tasks = []
-    for agent_ws in run_env["agent_workspaces"]:
+    # Bound the number of agents (and MCP containers) running at once
+    agent_slots = asyncio.Semaphore(MAX_CONCURRENT_AGENTS)
+
+    async def run_and_save(agent_ws: Dict[str, Any]) -> Dict[str, Any]:
         agent_id = agent_ws["agent_id"]
         # Create enhanced prompt with git commit instructions
         enhanced_prompt = create_agent_prompt(prompt, agent_ws)
-        tasks.append(run_agent(agent_id, enhanced_prompt, agent_ws))
-
-    # Run all agents concurrently
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    # Process results
-    processed_results = []
-    for i, result in enumerate(results):
-        if isinstance(result, Exception):
-            agent_ws = run_env["agent_workspaces"][i]
-            processed_results.append({
-                "agent_id": agent_ws["agent_id"],
+        try:
+            async with agent_slots:
+                if MCP_AGENT_CONTAINERS and docker_check and docker_check["mcp_image_exists"]:
+                    agent_ws["container_id"] = await start_agent_container(run_env["run_id"], agent_ws)
+                try:
+                    result = await run_agent(agent_id, enhanced_prompt, agent_ws, docker_check, verbose)
+                finally:
+                    if agent_ws.get("container_id"):
+                        await remove_agent_container(agent_ws["container_id"])
+        except Exception as e:
+            result = {
+                "agent_id": agent_id,
                 "status": "error",
-                "error": str(result),
+                "error": str(e),
                 "workspace": {
                     "worktree_path": agent_ws["worktree_path"],
                     "branch_name": agent_ws["branch_name"]
                 }
-            })
-        else:
-            processed_results.append(result)
+            }
+        await asyncio.to_thread(cap_agent_result, run_env["run_dir"], result)
+        await asyncio.to_thread(save_agent_result, run_env["run_dir"], result)
+        if on_result:
+            on_result(result)
+        return result
+
+    agent_workspaces = run_env["agent_workspaces"]
+    if len(agent_workspaces) == 1:
+        # A single agent can be awaited directly without scheduling tasks
+        processed_results = [await run_and_save(agent_workspaces[0])]
+    else:
+        # Run all agents concurrently and collect results as they finish
+        processed_results = []
+        for next_result in asyncio.as_completed([run_and_save(ws) for ws in agent_workspaces]):
+            processed_results.append(await next_result)
+        processed_results.sort(key=lambda r: r["agent_id"])
 
     return {
         "run_info": {
@@ -577,83 +1100,263 @@ async def orchestrate_agents(prompt: str, agent_count: int) -> Dict[str, Any]:
     }
 
 
+async def heartbeat_run_status(run_id: str) -> None:
+    """
+    Refresh the mtime of a running task's status file until cancelled.
+
+    Args:
+        run_id: Run ID doubling as the task ID
+    """
+    status_path = os.path.join(WORKSPACE_LOCAL, "runs", f"run_{run_id}", "status.json")
+    while True:
+        await asyncio.sleep(TASK_HEARTBEAT_INTERVAL)
+        try:
+            await asyncio.to_thread(os.utime, status_path)
+        except OSError as e:
+            logger.warning("Heartbeat for task %s failed: %s", run_id, e)
+
+
+async def run_orchestration_task(run_id: str, prompt: str, agent_count: int, started_at: str,
+                                 verbose: bool = False) -> None:
+    """
+    Run an orchestration in the background and record its final status.
+
+    If the task is cancelled (the orchestrator shuts down mid-run), the run is
+    recorded as failed so pollers don't wait for it forever.
+
+    Args:
+        run_id: Run ID doubling as the task ID
+        prompt: The prompt to send to all agents
+        agent_count: Number of agents to spawn
+        started_at: UTC time the task was accepted (ISO_TIME_FORMAT)
+        verbose: If true, capture intermediate messages in each agent's result
+    """
+    heartbeat = asyncio.create_task(heartbeat_run_status(run_id))
+    try:
+        orchestration_result = await orchestrate_agents(prompt, agent_count, run_id, verbose=verbose)
+        status = {
+            "task_id": run_id,
+            "status": "completed",
+            "started_at": started_at,
+            "run_info": orchestration_result["run_info"],
+            "summary": summarize_results(orchestration_result["results"], agent_count),
+            "results": orchestration_result["results"]
+        }
+        await asyncio.to_thread(write_run_status, run_id, status)
+    except Exception as e:
+        logger.error("Background orchestration %s failed: %s", run_id, e)
+        logger.error("Background orchestration traceback:\n%s", traceback.format_exc())
+        status = {"task_id": run_id, "status": "failed", "started_at": started_at, "error": str(e)}
+        try:
+            await asyncio.to_thread(write_run_status, run_id, status)
+        except Exception as write_error:
+            logger.error("Could not record failure of background orchestration %s: %s", run_id, write_error)
+    except asyncio.CancelledError:
+        logger.warning("Background orchestration %s interrupted by shutdown", run_id)
+        # Written without awaiting: the cancelled task may not get to run again.
+        # Results of agents that finished are still picked up from results/
+        write_run_status(run_id, {
+            "task_id": run_id,
+            "status": "failed",
+            "agent_count": agent_count,
+            "started_at": started_at,
+            "error": "Interrupted: the orchestrator shut down before the run finished"
+        })
+        raise
+    finally:
+        heartbeat.cancel()
+
+
+async def stream_orchestration(prompt: str, agent_count: int, verbose: bool = False):
+    """
+    Run an orchestration and yield Server-Sent Events as agents finish.
+
+    Args:
+        prompt: The prompt to send to all agents
+        agent_count: Number of agents to spawn
+        verbose: If true, capture intermediate messages in each agent's result
+
+    Yields:
+        SSE-formatted event strings
+    """
+    events = asyncio.Queue()
+    task = asyncio.create_task(
+        orchestrate_agents(prompt, agent_count, on_result=events.put_nowait, verbose=verbose)
+    )
+    task.add_done_callback(lambda t: events.put_nowait(None))
+
+    while True:
+        result = await events.get()
+        if result is None:
+            break
+        yield f"event: agent\ndata: {orjson.dumps(result).decode()}\n\n"
+
+    try:
+        orchestration_result = task.result()
+    except Exception as e:
+        logger.error("Streaming orchestration error: %s", e)
+        yield f"event: error\ndata: {orjson.dumps({'error': str(e)}).decode()}\n\n"
+        return
+
+    results = orchestration_result["results"]
+    completed = {
+        "status": "completed",
+        "run_info": orchestration_result["run_info"],
+        "summary": summarize_results(results, agent_count)
+    }
+    yield f"event: completed\ndata: {orjson.dumps(completed).decode()}\n\n"
+
+
+@app.before_serving
+async def start_docker_status_refresh():
+    """Keep the cached Docker status warm for diagnostics and orchestrations."""
+    app.docker_status_task = asyncio.create_task(keep_docker_status_fresh())
+
+
+@app.after_serving
+async def stop_docker_status_refresh():
+    """Stop the background Docker status refresh on shutdown."""
+    app.docker_status_task.cancel()
+
+
 @app.route("/orchestrate", methods=["POST"])
-def orchestrate():
+async def orchestrate():
     """
     Handle orchestration requests from the frontend.
     Expects JSON body with 'prompt' and 'agent_count'.
 
     Creates a git repository for the run with a worktree per agent.
     Each agent gets instructions to commit their changes to their branch.
+
+    If 'async' is true, the orchestration runs in the background and a
+    task ID is returned immediately with status 202. Poll /tasks/<task_id>
+    for progress and results.
+
+    If 'stream' is true, results are sent as Server-Sent Events: one
+    'agent' event per finished agent, then a final 'completed' event.
+
+    Intermediate agent messages are only included if 'verbose' is true.
     """
     try:
-        data = request.get_json()
+        data = await request.get_json()
         prompt = data.get("prompt", "").strip()
         agent_count = data.get("agent_count", 1)
+        run_async = bool(data.get("async", False))
+        stream = bool(data.get("stream", False))
+        verbose = bool(data.get("verbose", False))
 
         if not prompt:
-            return jsonify({"error": "Prompt is required"}), 400
+            return json_response({"error": "Prompt is required"}, 400)
 
-        if not isinstance(agent_count, int) or agent_count < 1 or agent_count > 10:
-            return jsonify({"error": "Agent count must be between 1 and 10"}), 400
+        # type() rather than isinstance(): booleans are ints but not agent counts
+        if type(agent_count) is not int or agent_count < 1 or agent_count > 10:
+            return json_response({"error": "Agent count must be between 1 and 10"}, 400)
 
         if not ANTHROPIC_API_KEY:
-            return jsonify({"error": "ANTHROPIC_API_KEY not configured"}), 500
+            return json_response({"error": "ANTHROPIC_API_KEY not configured"}, 500)
+
+        logger.info("Received orchestration request: %d agents", agent_count)
+
+        if run_async:
+            task_id = generate_run_id()
+            started_at = time.strftime(ISO_TIME_FORMAT, time.gmtime())
+            await asyncio.to_thread(write_run_status, task_id, {
+                "task_id": task_id,
+                "status": "running",
+                "agent_count": agent_count,
+                "started_at": started_at
+            })
+            app.add_background_task(run_orchestration_task, task_id, prompt, agent_count, started_at, verbose)
+            logger.info("Queued background orchestration %s", task_id)
+            return json_response({
+                "task_id": task_id,
+                "status": "running",
+                "status_url": f"/tasks/{task_id}"
+            }, 202)
 
-        logger.info(f"Received orchestration request: {agent_count} agents")
+        if stream:
+            return Response(stream_orchestration(prompt, agent_count, verbose), mimetype="text/event-stream")
 
         # Run the async orchestration
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            orchestration_result = loop.run_until_complete(
-                orchestrate_agents(prompt, agent_count)
-            )
-        finally:
-            loop.close()
+        orchestration_result = await orchestrate_agents(prompt, agent_count, verbose=verbose)
 
         # Extract results from the orchestration
         results = orchestration_result["results"]
         run_info = orchestration_result["run_info"]
 
-        # Count successes and failures
-        success_count = sum(1 for r in results if r.get("status") == "success")
-        error_count = sum(1 for r in results if r.get("status") == "error")
-
-        return jsonify({
+        return json_response({
             "status": "completed",
             "run_info": run_info,
-            "summary": {
-                "total_agents": agent_count,
-                "successful": success_count,
-                "failed": error_count
-            },
+            "summary": summarize_results(results, agent_count),
             "results": results
         })
 
     except Exception as e:
-        logger.error(f"Orchestration error: {e}")
-        logger.error(f"Orchestration traceback:\n{traceback.format_exc()}")
-        return jsonify({"error": str(e), "traceback": traceback.format_exc()}), 500
+        tb = traceback.format_exc()
+        logger.error("Orchestration error: %s", e)
+        logger.error("Orchestration traceback:\n%s", tb)
+        return json_response({"error": str(e), "traceback": tb}, 500)
+
+
+@app.route("/tasks/<task_id>")
+async def get_task(task_id):
+    """
+    Get the status of a background orchestration.
+    Includes the results of all agents that have finished so far.
+    """
+    if not RUN_ID_PATTERN.fullmatch(task_id):
+        return json_response({"error": f"Invalid task ID: {task_id}"}, 400)
+
+    try:
+        status = await asyncio.to_thread(load_run_status, task_id)
+    except Exception as e:
+        logger.error("Error loading task %s: %s", task_id, e)
+        return json_response({"error": str(e)}, 500)
+
+    if status is None:
+        return json_response({"error": f"Task not found: {task_id}"}, 404)
+
+    return json_response(status)
+
+
+@app.route("/runs/<run_id>/agent/<int:agent_id>/output")
+async def get_agent_output(run_id, agent_id):
+    """
+    Get the full output of an agent, including any part truncated in responses.
+    """
+    if not RUN_ID_PATTERN.fullmatch(run_id):
+        return json_response({"error": f"Invalid run ID: {run_id}"}, 400)
+
+    try:
+        output_path, output = await asyncio.to_thread(load_agent_output, run_id, agent_id)
+    except Exception as e:
+        logger.error("Error loading output of agent %s in run %s: %s", agent_id, run_id, e)
+        return json_response({"error": str(e)}, 500)
+
+    if output_path:
+        return await send_file(output_path, mimetype="text/plain", cache_timeout=0)
+    if output is None:
+        return json_response({"error": f"No result for agent {agent_id} in run {run_id}"}, 404)
+    return Response(output, mimetype="text/plain")
 
 
 @app.route("/health")
-def health():
+async def health():
     """Health check endpoint for Kubernetes probes."""
-    return jsonify({"status": "healthy"})
+    return json_response({"status": "healthy"})
 
 
 @app.route("/ready")
-def ready():
+async def ready():
     """Readiness check endpoint for Kubernetes probes."""
     # Check if API key is configured
     if not ANTHROPIC_API_KEY:
-        return jsonify({"status": "not_ready", "reason": "ANTHROPIC_API_KEY not set"}), 503
-    return jsonify({"status": "ready"})
+        return json_response({"status": "not_ready", "reason": "ANTHROPIC_API_KEY not set"}, 503)
+    return json_response({"status": "ready"})
 
 
 @app.route("/diagnostics")
-def diagnostics():
+async def diagnostics():
     """
     Diagnostic endpoint to check Docker and system status.
     Use this to troubleshoot issues with agent execution.
@@ -667,7 +1370,7 @@ def diagnostics():
         workspace_files = [f"Error listing: {e}"]
 
     diag = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": time.strftime(ISO_TIME_FORMAT, time.gmtime()),
         "environment": {
             "ANTHROPIC_API_KEY": "***SET***" if ANTHROPIC_API_KEY else "NOT SET",
             "WORKSPACE_PATH": WORKSPACE_PATH,  # Path used for docker run -v (on Docker host)
@@ -677,7 +1380,7 @@ def diagnostics():
             "LOG_LEVEL": LOG_LEVEL,
             "POD_NAME": os.getenv("POD_NAME", "unknown"),
         },
-        "docker": check_docker_available(),
+        "docker": await get_docker_status(),
         "filesystem": {
             "workspace_local_exists": os.path.exists(WORKSPACE_LOCAL),
             "workspace_local_writable": os.access(WORKSPACE_LOCAL, os.W_OK) if os.path.exists(WORKSPACE_LOCAL) else False,
@@ -687,7 +1390,7 @@ def diagnostics():
         }
     }
 
-    logger.info(f"Diagnostics requested: {json.dumps(diag, indent=2)}")
+    logger.debug("Diagnostics requested: %s", diag)
 
     # Determine overall status
     docker_ok = (
@@ -699,11 +1402,11 @@ def diagnostics():
 
     diag["status"] = "ok" if docker_ok else "issues_detected"
 
-    return jsonify(diag)
+    return json_response(diag)
 
 
 @app.route("/test-docker")
-def test_docker():
+async def test_docker():
     """
     Test Docker by running a simple command.
     """
@@ -715,7 +1418,8 @@ def test_docker():
     }
 
     try:
-        proc = subprocess.run(
+        proc = await asyncio.to_thread(
+            subprocess.run,
             ["docker", "run", "--rm", "alpine:latest", "echo", "Hello from Docker!"],
             capture_output=True,
             text=True,
@@ -731,9 +1435,34 @@ def test_docker():
         result["error"] = str(e)
         result["traceback"] = traceback.format_exc()
 
-    logger.info(f"Docker test result: {json.dumps(result, indent=2)}")
+    logger.info("Docker test result: %s", result)
+
+    return json_response(result)
 
-    return jsonify(result)
+
+def describe_workspace_file(file_path: str, entry: os.DirEntry) -> Dict[str, Any]:
+    """
+    Build the /workspace listing record for a file.
+
+    Args:
+        file_path: Path of the file relative to the workspace
+        entry: Directory entry of the file
+
+    Returns:
+        Dictionary with path, size and modification time, or the stat error
+    """
+    try:
+        stat = entry.stat(follow_symlinks=False)
+        return {
+            "path": file_path,
+            "size": stat.st_size,
+            "modified": time.strftime(ISO_TIME_FORMAT, time.gmtime(stat.st_mtime))
+        }
+    except Exception as e:
+        return {
+            "path": file_path,
+            "error": str(e)
+        }
 
 
 @app.route("/workspace")
@@ -752,80 +1481,118 @@ def list_workspace():
     try:
         if not os.path.exists(WORKSPACE_LOCAL):
             result["error"] = f"Workspace directory does not exist: {WORKSPACE_LOCAL}"
-            return jsonify(result), 404
-
-        # Walk through workspace and list files
-        for root, dirs, files in os.walk(WORKSPACE_LOCAL):
-            rel_root = os.path.relpath(root, WORKSPACE_LOCAL)
-            if rel_root == ".":
-                rel_root = ""
-
-            for f in files:
-                file_path = os.path.join(rel_root, f) if rel_root else f
-                full_path = os.path.join(root, f)
-                try:
-                    stat = os.stat(full_path)
-                    result["files"].append({
-                        "path": file_path,
-                        "size": stat.st_size,
-                        "modified": datetime.fromtimestamp(stat.st_mtime).isoformat()
-                    })
-                except Exception as e:
-                    result["files"].append({
-                        "path": file_path,
-                        "error": str(e)
-                    })
-
-            # Limit depth and total files
-            if len(result["files"]) > 100:
-                result["truncated"] = True
-                break
+            return json_response(result, 404)
+
+        # Breadth-first walk through workspace, stopping at the file limit
+        found = []
+        pending = collections.deque([""])
+        while pending:
+            rel_root = pending.popleft()
+            with os.scandir(os.path.join(WORKSPACE_LOCAL, rel_root)) as entries:
+                for entry in entries:
+                    file_path = os.path.join(rel_root, entry.name) if rel_root else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(file_path)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+
+                    # Limit total files
+                    if len(found) >= MAX_LISTED_FILES:
+                        result["truncated"] = True
+                        pending.clear()
+                        break
+                    found.append((file_path, entry))
+
+        # Stat the files, in parallel if each stat is a network round-trip
+        mapper = stat_pool.map if stat_pool else map
+        result["files"] = list(mapper(describe_workspace_file, *zip(*found))) if found else []
 
     except Exception as e:
         result["error"] = str(e)
-        logger.error(f"Error listing workspace: {e}")
-        return jsonify(result), 500
+        logger.error("Error listing workspace: %s", e)
+        return json_response(result, 500)
 
-    return jsonify(result)
+    return json_response(result)
 
 
-@app.route("/workspace/<path:filepath>")
-def get_workspace_file(filepath):
+def check_workspace_file(filepath: str, read_content: bool) -> Tuple[int, Any]:
     """
-    Get contents of a specific file from the workspace.
+    Resolve a requested workspace file, check it can be served and optionally read it.
+
+    Stats, probes and reads with blocking calls, so run it in a thread.
+
+    Args:
+        filepath: Path relative to the workspace, as requested
+        read_content: If true, read the whole file as text
+
+    Returns:
+        (200, (full path, content or None)) if the file can be served,
+        otherwise (HTTP status, error message)
     """
-    full_path = os.path.join(WORKSPACE_LOCAL, filepath)
+    full_path = os.path.realpath(os.path.join(_WORKSPACE_ROOT, filepath))
 
-    # Security: ensure path is within workspace
-    if not os.path.abspath(full_path).startswith(os.path.abspath(WORKSPACE_LOCAL)):
-        return jsonify({"error": "Access denied: path traversal detected"}), 403
+    # Security: ensure path (after resolving symlinks) is within workspace
+    if os.path.commonpath([full_path, _WORKSPACE_ROOT]) != _WORKSPACE_ROOT:
+        return 403, "Access denied: path traversal detected"
 
     if not os.path.exists(full_path):
-        return jsonify({"error": f"File not found: {filepath}"}), 404
+        return 404, f"File not found: {filepath}"
 
     if os.path.isdir(full_path):
-        return jsonify({"error": f"Path is a directory: {filepath}"}), 400
+        return 400, f"Path is a directory: {filepath}"
+
+    # Limit file size to 1MB for safety
+    if os.path.getsize(full_path) > 1024 * 1024:
+        return 413, "File too large (>1MB)"
 
     try:
-        # Limit file size to 1MB for safety
-        if os.path.getsize(full_path) > 1024 * 1024:
-            return jsonify({"error": "File too large (>1MB)"}), 413
+        if read_content:
+            with open(full_path, 'r') as f:
+                return 200, (full_path, f.read())
+
+        # Reject binary files by probing the start of the file; the
+        # incremental decoder tolerates a character cut off at the end
+        with open(full_path, 'rb') as f:
+            codecs.getincrementaldecoder("utf-8")().decode(f.read(4096))
+    except UnicodeDecodeError:
+        return 415, "Binary file, cannot display as text"
 
-        with open(full_path, 'r') as f:
-            content = f.read()
+    return 200, (full_path, None)
 
-        return jsonify({
-            "path": filepath,
-            "content": content,
-            "size": len(content)
-        })
-    except UnicodeDecodeError:
-        return jsonify({"error": "Binary file, cannot display as text"}), 415
+
+@app.route("/workspace/<path:filepath>")
+async def get_workspace_file(filepath):
+    """
+    Get contents of a specific file from the workspace.
+
+    The file is streamed as text/plain. Pass ?format=json to get the
+    path, content and size in a JSON object instead.
+    """
+    as_json = request.args.get("format") == "json"
+    try:
+        status, result = await asyncio.to_thread(check_workspace_file, filepath, as_json)
+        if status != 200:
+            return json_response({"error": result}, status)
+
+        full_path, content = result
+        if as_json:
+            return json_response({
+                "path": filepath,
+                "content": content,
+                "size": len(content)
+            })
+
+        return await send_file(full_path, mimetype="text/plain", cache_timeout=0)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 
 if __name__ == "__main__":
+    import uvloop
+
+    # Match production (hypercorn --worker-class uvloop) when run directly
+    uvloop.install()
     port = int(os.getenv("PORT", 8080))
     debug = os.getenv("FLASK_DEBUG", "false").lower() == "true"
     app.run(host="0.0.0.0", port=port, debug=debug)
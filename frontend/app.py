@@ -4,84 +4,538 @@ Allows users to enter prompts and specify the number of agents to work on them.
 """
 
 import os
+
+# Patch sockets before httpx is imported so outbound calls
+# yield to other greenlets. gunicorn's gevent worker patches on its own, but
+# only after the app is imported when it is preloaded.
+if os.getenv("GEVENT_MONKEY_PATCH", "false").lower() == "true":
+    from gevent import monkey
+    monkey.patch_all()
+
+import hashlib
 import logging
-from flask import Flask, render_template, request, jsonify
-import requests
+import re
+import threading
+from typing import Annotated, Optional
+from cachetools import TTLCache
+import msgspec
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+from flask import Flask, Response, render_template, request
+from flask.json.provider import DefaultJSONProvider
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from prometheus_client import CollectorRegistry, Histogram, make_wsgi_app, multiprocess
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# httpx logs every request at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class MsgspecProvider(DefaultJSONProvider):
+    """JSON provider that encodes and decodes with msgspec."""
+
+    def dumps(self, obj, **kwargs):
+        return msgspec.json.encode(obj, enc_hook=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return msgspec.json.decode(s)
+
 
 app = Flask(__name__)
+app.json = MsgspecProvider(app)
+
+# Latency of calls to the orchestrator, recorded in the frontend process
+ORCHESTRATOR_LATENCY = Histogram(
+    "orchestrator_request_seconds",
+    "Time until the orchestrator answered a frontend request",
+    ["endpoint"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+
+def metrics_wsgi_app():
+    """
+    Create the WSGI app serving /metrics.
+
+    Under gunicorn, each worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+    and the scrape aggregates them across workers.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # A preloaded app is imported before gunicorn's on_starting creates it
+        os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return make_wsgi_app(registry)
+    return make_wsgi_app()
+
+
+# /metrics is dispatched before Flask, so it skips routing and rate limits
+app.wsgi_app = DispatcherMiddleware(app.wsgi_app, {"/metrics": metrics_wsgi_app()})
 
-# Backend orchestrator service URL (Kubernetes service DNS)
+# Per-client limit on /submit, keyed on the client IP. The service uses
+# externalTrafficPolicy: Local so that is the real client address rather than
+# a node IP shared by everyone. Counters live in RATELIMIT_STORAGE_URI; the
+# in-memory default counts per worker process, use redis:// to share them
+SUBMIT_RATE_LIMIT = os.getenv("SUBMIT_RATE_LIMIT", "10/minute;2/second")
+limiter = Limiter(
+    get_remote_address,
+    app=app,
+    storage_uri=os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+)
+
+# Backend orchestrator service URL (Kubernetes service DNS). Calls go to the
+# service directly; the deployment excludes its port from any sidecar proxy.
 ORCHESTRATOR_URL = os.getenv("ORCHESTRATOR_URL", "http://orchestrator-service.backend.svc.cluster.local:8080")
 
+# Speak HTTP/2 to the orchestrator (prior knowledge, hypercorn accepts it on
+# plain http) so concurrent calls share one connection as multiplexed streams.
+# Off by default: kube-proxy balances the orchestrator service per connection
+# and each orchestration runs on the pod that accepted it, so one HTTP/2
+# connection per worker would pin all of a worker's runs to a single pod.
+ORCHESTRATOR_HTTP2 = os.getenv("ORCHESTRATOR_HTTP2", "false").lower() == "true"
+
+# Shared HTTP client so connections to the orchestrator are kept alive and
+# pooled across requests. Idle connections are closed after a few seconds,
+# so new calls reconnect and get spread over the orchestrator pods again.
+# Failed connects are retried; requests are never re-sent once the
+# orchestrator may have received them.
+CLIENT = httpx.Client(
+    transport=httpx.HTTPTransport(
+        http1=not ORCHESTRATOR_HTTP2,
+        http2=ORCHESTRATOR_HTTP2,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=5.0),
+        retries=2
+    )
+)
+
+# Responses that never change while the process runs, with their ETags
+with app.app_context():
+    INDEX_HTML = render_template("index.html").encode()
+HEALTH_BYTES = b'{"status":"healthy"}'
+READY_BYTES = b'{"status":"ready"}'
+
+
+def make_etag(body: bytes) -> str:
+    """Compute a strong ETag for a response body."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+INDEX_ETAG = make_etag(INDEX_HTML)
+HEALTH_ETAG = make_etag(HEALTH_BYTES)
+READY_ETAG = make_etag(READY_BYTES)
+
+
+def cached_response(body, etag: str, mimetype: str, cache_control: str):
+    """
+    Build a response with an ETag that answers matching If-None-Match with 304.
+
+    Args:
+        body: Response body
+        etag: ETag of the body
+        mimetype: Content type of the body
+        cache_control: Cache-Control header value
+
+    Returns:
+        Flask response, 304 Not Modified if the client already has the body
+    """
+    response = app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response.make_conditional(request)
+
+
+class SubmitRequest(msgspec.Struct):
+    """Body of a /submit request."""
+    prompt: str = ""
+    agent_count: Annotated[int, msgspec.Meta(ge=1, le=10)] = 1
+
+
+class OrchestrateRequest(msgspec.Struct):
+    """Body of the background /orchestrate call made for a submission."""
+    prompt: str
+    agent_count: int
+    run_async: bool = msgspec.field(default=True, name="async")
+
+
+# Parses and validates /submit bodies in one pass
+SUBMIT_DECODER = msgspec.json.Decoder(SubmitRequest)
+# Encodes orchestrator calls and frontend responses straight to bytes
+JSON_ENCODER = msgspec.json.Encoder()
+
+# Chunk size for passing orchestrator responses through to the client
+PROXY_CHUNK_SIZE = 64 * 1024
+# Bytes of an orchestrator error body included in error responses
+ERROR_DETAIL_BYTES = 1024
+
+# Bodies of fixed error responses, encoded once
+ERR_EMPTY_PROMPT = JSON_ENCODER.encode({"error": "Prompt cannot be empty"})
+ERR_AGENT_COUNT = JSON_ENCODER.encode({"error": "Agent count must be between 1 and 10"})
+ERR_INVALID_JSON = JSON_ENCODER.encode({"error": "Request body must be valid JSON"})
+ERR_SUBMIT_TIMEOUT = JSON_ENCODER.encode({"error": "Request timed out. The task may still be processing."})
+ERR_TASK_TIMEOUT = JSON_ENCODER.encode({"error": "Request timed out"})
+ERR_UNAVAILABLE = JSON_ENCODER.encode({"error": "Cannot connect to orchestrator service"})
+ERR_LENGTH_REQUIRED = JSON_ENCODER.encode({"error": "Content-Length is required"})
+ERR_TOO_LARGE = JSON_ENCODER.encode({"error": "Request body too large"})
+ERR_CONTENT_TYPE = JSON_ENCODER.encode({"error": "Content-Type must be application/json"})
+
+# Largest /submit body accepted; prompts are far smaller
+MAX_SUBMIT_BYTES = 64 * 1024
+
+
+class SubmitGuard:
+    """
+    WSGI middleware rejecting malformed /submit requests from their headers.
+
+    Bodies without a Content-Length, larger than MAX_SUBMIT_BYTES or not
+    declared as JSON are turned away before Flask reads or parses them.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO") == "/submit" and environ.get("REQUEST_METHOD") == "POST":
+            length = environ.get("CONTENT_LENGTH")
+            if not length or not length.isdigit():
+                return self.reject(start_response, "411 Length Required", ERR_LENGTH_REQUIRED)
+            if int(length) > MAX_SUBMIT_BYTES:
+                return self.reject(start_response, "413 Request Entity Too Large", ERR_TOO_LARGE)
+            content_type = environ.get("CONTENT_TYPE", "").partition(";")[0].strip().lower()
+            if content_type != "application/json":
+                return self.reject(start_response, "415 Unsupported Media Type", ERR_CONTENT_TYPE)
+        return self.wsgi_app(environ, start_response)
+
+    @staticmethod
+    def reject(start_response, status: str, body: bytes):
+        start_response(status, [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body)))
+        ])
+        return [body]
+
+
+# Checked before routing, rate limiting and body parsing
+app.wsgi_app = SubmitGuard(app.wsgi_app)
+
+
+def json_response(payload, status: int = 200) -> Response:
+    """
+    Create a JSON response serialized with msgspec, bypassing jsonify.
+
+    Args:
+        payload: JSON-serializable object
+        status: HTTP status code
+
+    Returns:
+        Flask response with application/json body
+    """
+    return app.response_class(JSON_ENCODER.encode(payload), status=status, mimetype="application/json")
+
+
+def error_response(body: bytes, status: int) -> Response:
+    """Build a JSON error response from a pre-encoded body."""
+    return app.response_class(body, status=status, mimetype="application/json")
+
+
+# Seconds a submission's task is handed out again for an identical resubmission
+SUBMIT_DEDUP_TTL = 120
+# Seconds to wait for the orchestrator to accept a submission
+SUBMIT_TIMEOUT = 30
+
+# Accepted submissions (202 bodies) by request key, and the keys whose
+# submission is currently in flight
+_submit_cache = TTLCache(maxsize=256, ttl=SUBMIT_DEDUP_TTL)
+_submit_inflight = {}
+# (request key, 202 body) of the cached submissions by task ID, so a task that
+# stopped running can be dropped from _submit_cache when its status is polled
+_submit_tasks = TTLCache(maxsize=256, ttl=SUBMIT_DEDUP_TTL)
+_submit_lock = threading.Lock()
+
+
+class AcceptedTask(msgspec.Struct):
+    """Part of the orchestrator's 202 body identifying the started task."""
+    task_id: str
+
+
+class TaskState(msgspec.Struct):
+    """Part of a /tasks body telling whether the task is still running."""
+    status: str = ""
+    stale: bool = False
+
+
+ACCEPTED_DECODER = msgspec.json.Decoder(AcceptedTask)
+TASK_STATE_DECODER = msgspec.json.Decoder(TaskState)
+
+
+def submission_key(prompt: str, agent_count: int) -> bytes:
+    """Key identifying identical submissions."""
+    return hashlib.blake2b(f"{agent_count}:{prompt}".encode(), digest_size=16).digest()
+
+
+def claim_submission(key: bytes) -> Optional[bytes]:
+    """
+    Get the accepted task of an identical recent submission, or claim the key.
+
+    If an identical submission is in flight, waits for it to finish first,
+    so concurrent duplicates result in a single orchestration.
+
+    Args:
+        key: Key from submission_key()
+
+    Returns:
+        The cached 202 body, or None if the caller now owns the submission
+        and must call release_submission() when done
+    """
+    while True:
+        with _submit_lock:
+            body = _submit_cache.get(key)
+            if body is not None:
+                return body
+            pending = _submit_inflight.get(key)
+            if pending is None:
+                _submit_inflight[key] = threading.Event()
+                return None
+        pending.wait(SUBMIT_TIMEOUT)
+
+
+def release_submission(key: bytes, body: Optional[bytes]) -> None:
+    """
+    Finish a claimed submission and wake up callers waiting for it.
+
+    Args:
+        key: Key passed to claim_submission()
+        body: The 202 body if the orchestrator accepted the task, else None
+    """
+    task_id = None
+    if body is not None:
+        try:
+            task_id = ACCEPTED_DECODER.decode(body).task_id
+        except msgspec.MsgspecError:
+            logger.warning("Accepted submission without a task ID: %.200s", body)
+
+    with _submit_lock:
+        if body is not None:
+            _submit_cache[key] = body
+            if task_id is not None:
+                _submit_tasks[task_id] = (key, body)
+        _submit_inflight.pop(key).set()
+
+
+def is_tracked_task(task_id: str) -> bool:
+    """Check whether a task is handed out to duplicate submissions."""
+    with _submit_lock:
+        return task_id in _submit_tasks
+
+
+def settle_submission(task_id: str, status_code: int, body: bytes) -> None:
+    """
+    Stop handing out a task to duplicate submissions once it no longer runs.
+
+    Failed, completed, stale and unknown tasks are dropped, so submitting
+    the same prompt again starts a new orchestration.
+
+    Args:
+        task_id: Task whose status was polled
+        status_code: Status code of the orchestrator's /tasks response
+        body: Body of the orchestrator's /tasks response
+    """
+    if status_code == 200:
+        try:
+            state = TASK_STATE_DECODER.decode(body)
+        except msgspec.MsgspecError:
+            return
+        if state.status == "running" and not state.stale:
+            return
+    elif status_code != 404:
+        # Transient orchestrator errors say nothing about the task
+        return
+
+    with _submit_lock:
+        entry = _submit_tasks.pop(task_id, None)
+        if entry is not None:
+            key, accepted = entry
+            if _submit_cache.get(key) is accepted:
+                del _submit_cache[key]
+
+
+# Task IDs issued by the orchestrator for background orchestrations
+TASK_ID_PATTERN = re.compile(r"[0-9]{8}_[0-9]{6}_[0-9a-f]{8}")
+
+
+def proxy_response(upstream: httpx.Response):
+    """
+    Pass an orchestrator response through to the client without parsing it.
+
+    The body is forwarded in chunks as it arrives; the upstream connection
+    goes back to the client pool once the body is fully sent.
+
+    Args:
+        upstream: Orchestrator response, ideally sent with stream=True
+
+    Returns:
+        Flask response with the orchestrator's status, content type and body
+    """
+    def body():
+        try:
+            yield from upstream.iter_bytes(PROXY_CHUNK_SIZE)
+        finally:
+            upstream.close()
+
+    return app.response_class(
+        body(),
+        status=upstream.status_code,
+        content_type=upstream.headers.get("Content-Type", "application/json")
+    )
+
 
 @app.route("/")
 def index():
     """Render the main page with prompt input form."""
-    return render_template("index.html")
+    if app.debug:
+        # Pick up template edits during development
+        return render_template("index.html")
+    return cached_response(INDEX_HTML, INDEX_ETAG, "text/html", "public, max-age=60")
 
 
 @app.route("/submit", methods=["POST"])
+# Rejected bodies (400) don't use up the client's allowance
+@limiter.limit(SUBMIT_RATE_LIMIT, deduct_when=lambda response: response.status_code != 400)
 def submit_task():
     """
     Handle form submission - send prompt and agent count to orchestrator.
     """
     try:
-        data = request.get_json()
-        prompt = data.get("prompt", "").strip()
-        agent_count = data.get("agent_count", 1)
-
-        if not prompt:
-            return jsonify({"error": "Prompt cannot be empty"}), 400
-
-        if not isinstance(agent_count, int) or agent_count < 1 or agent_count > 10:
-            return jsonify({"error": "Agent count must be between 1 and 10"}), 400
-
-        logger.info(f"Submitting task with {agent_count} agents: {prompt[:50]}...")
-
-        # Call the orchestrator service
-        response = requests.post(
-            f"{ORCHESTRATOR_URL}/orchestrate",
-            json={
-                "prompt": prompt,
-                "agent_count": agent_count
-            },
-            timeout=300  # 5 minute timeout for long-running tasks
-        )
+        try:
+            submit = SUBMIT_DECODER.decode(request.get_data())
+        except msgspec.ValidationError as e:
+            if "$.agent_count" in str(e):
+                return error_response(ERR_AGENT_COUNT, 400)
+            return json_response({"error": f"Invalid request: {e}"}, 400)
+        except msgspec.DecodeError:
+            return error_response(ERR_INVALID_JSON, 400)
+
+        # agent_count was type- and range-checked by the decoder (booleans
+        # are rejected), so only the prompt needs a look here
+        if not (prompt := submit.prompt.strip()):
+            return error_response(ERR_EMPTY_PROMPT, 400)
+        agent_count = submit.agent_count
+
+        # Hand out the task of an identical recent submission (double-clicks,
+        # retries) instead of starting another orchestration
+        key = submission_key(prompt, agent_count)
+        accepted = claim_submission(key)
+        if accepted is not None:
+            logger.info("Reusing task for duplicate submission with %d agents: %.50s...", agent_count, prompt)
+            return app.response_class(accepted, status=202, mimetype="application/json")
+
+        logger.info("Submitting task with %d agents: %.50s...", agent_count, prompt)
 
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            logger.error(f"Orchestrator error: {response.status_code} - {response.text}")
-            return jsonify({"error": f"Orchestrator error: {response.text}"}), response.status_code
+        accepted = None
+        try:
+            # Start the orchestration in the background; the page polls /tasks
+            # for the result, so no worker is held for the whole run
+            with ORCHESTRATOR_LATENCY.labels("orchestrate").time():
+                response = CLIENT.post(
+                    f"{ORCHESTRATOR_URL}/orchestrate",
+                    content=JSON_ENCODER.encode(OrchestrateRequest(prompt, agent_count)),
+                    headers={"Content-Type": "application/json"},
+                    timeout=SUBMIT_TIMEOUT
+                )
 
-    except requests.exceptions.Timeout:
+            if response.status_code == 202:
+                accepted = response.content
+                return app.response_class(accepted, status=202, mimetype="application/json")
+            else:
+                # Only decode the start of a possibly large error body
+                detail = response.content[:ERROR_DETAIL_BYTES].decode("utf-8", errors="replace")
+                logger.error("Orchestrator error: %d - %.200s", response.status_code, detail)
+                return json_response({"error": f"Orchestrator error: {detail}"}, response.status_code)
+        finally:
+            release_submission(key, accepted)
+
+    except httpx.TimeoutException:
         logger.error("Request to orchestrator timed out")
-        return jsonify({"error": "Request timed out. The task may still be processing."}), 504
-    except requests.exceptions.ConnectionError as e:
-        logger.error(f"Connection error to orchestrator: {e}")
-        return jsonify({"error": "Cannot connect to orchestrator service"}), 503
+        return error_response(ERR_SUBMIT_TIMEOUT, 504)
+    except httpx.TransportError as e:
+        logger.error("Connection error to orchestrator: %s", e)
+        return error_response(ERR_UNAVAILABLE, 503)
+    except Exception as e:
+        logger.error("Unexpected error: %s", e)
+        return json_response({"error": str(e)}, 500)
+
+
+@app.route("/tasks/<task_id>")
+def get_task(task_id):
+    """
+    Get the status and results of a submitted task from the orchestrator.
+    """
+    if not TASK_ID_PATTERN.fullmatch(task_id):
+        return json_response({"error": f"Invalid task ID: {task_id}"}, 400)
+
+    try:
+        # Tasks still handed out to duplicate submissions are read in full to
+        # see whether they stopped running; all others are streamed through
+        tracked = is_tracked_task(task_id)
+        with ORCHESTRATOR_LATENCY.labels("tasks").time():
+            response = CLIENT.send(
+                CLIENT.build_request("GET", f"{ORCHESTRATOR_URL}/tasks/{task_id}", timeout=10),
+                stream=not tracked
+            )
+        if not tracked:
+            return proxy_response(response)
+
+        settle_submission(task_id, response.status_code, response.content)
+        return app.response_class(
+            response.content,
+            status=response.status_code,
+            content_type=response.headers.get("Content-Type", "application/json")
+        )
+    except httpx.TimeoutException:
+        logger.error("Task status request to orchestrator timed out")
+        return error_response(ERR_TASK_TIMEOUT, 504)
+    except httpx.TransportError as e:
+        logger.error("Connection error to orchestrator: %s", e)
+        return error_response(ERR_UNAVAILABLE, 503)
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
-        return jsonify({"error": str(e)}), 500
+        logger.error("Unexpected error: %s", e)
+        return json_response({"error": str(e)}, 500)
+
+
+@app.errorhandler(429)
+def rate_limited(e):
+    """Return rate limit rejections as JSON like every other /submit error."""
+    return json_response({"error": f"Too many requests: {e.description}"}, 429)
 
 
 @app.route("/health")
+@limiter.exempt
 def health():
     """Health check endpoint for Kubernetes probes."""
-    return jsonify({"status": "healthy"})
+    return cached_response(HEALTH_BYTES, HEALTH_ETAG, "application/json", "no-cache")
 
 
 @app.route("/ready")
+@limiter.exempt
 def ready():
     """Readiness check endpoint for Kubernetes probes."""
-    return jsonify({"status": "ready"})
+    return cached_response(READY_BYTES, READY_ETAG, "application/json", "no-cache")
+
+
+# ASGI entry point for gunicorn's UvicornWorker (see gunicorn_conf.py); the
+# WSGI app runs in a thread pool behind uvloop and the httptools parser
+asgi_app = WsgiToAsgi(app)
 
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5000))
     debug = os.getenv("FLASK_DEBUG", "false").lower() == "true"
-    app.run(host="0.0.0.0", port=port, debug=debug)
+    if debug:
+        # Werkzeug dev server with the reloader
+        app.run(host="0.0.0.0", port=port, debug=debug)
+    else:
+        # Serve exactly like the container does
+        os.execvp("gunicorn", ["gunicorn", "-c", "gunicorn_conf.py", "app:app"])
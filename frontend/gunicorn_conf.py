@@ -0,0 +1,107 @@
+"""
+Gunicorn configuration for the frontend.
+
+gevent workers serve many concurrent requests per process: while a request
+waits on the orchestrator, its greenlet yields instead of holding an OS thread.
+
+Set GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker, GEVENT_MONKEY_PATCH=false
+and serve app:asgi_app to parse HTTP with httptools on a uvloop event loop
+instead. Requests then run in a thread pool, so long orchestrator calls tie up
+a thread each.
+
+The app is preloaded in the master and forked into the workers, so templates,
+compiled patterns and precomputed responses are shared copy-on-write. Nothing
+opens connections or files at import time; the orchestrator client only
+connects once a worker sends its first request.
+"""
+
+import ctypes
+import ctypes.util
+import multiprocessing
+import os
+import shutil
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from gevent import monkey
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+# Defaults to 2 x CPUs + 1; set it explicitly where the CPU count seen by the
+# container exceeds its CPU limit (Kubernetes)
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+worker_connections = 1000
+# Longer than the slowest orchestrator call made by a request
+timeout = 360
+
+# Side port answering /health and /ready from the master process, so probes
+# never queue behind user requests in the workers. 0 disables it.
+PROBE_PORT = int(os.getenv("PROBE_PORT", "5001"))
+
+HEALTH_BYTES = b'{"status":"healthy"}'
+READY_BYTES = b'{"status":"ready"}'
+NOT_READY_BYTES = b'{"status":"not ready"}'
+
+
+def on_starting(server):
+    """Start with an empty metrics directory so samples of old workers don't linger."""
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+
+
+def post_worker_init(worker):
+    """Hand memory freed while the worker started back to the OS (glibc only)."""
+    libc_path = ctypes.util.find_library("c")
+    if libc_path:
+        libc = ctypes.CDLL(libc_path)
+        if hasattr(libc, "malloc_trim"):
+            libc.malloc_trim(0)
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    """Start the probe listener once the master is up."""
+    if not PROBE_PORT:
+        return
+
+    class ProbeHandler(BaseHTTPRequestHandler):
+        """Answer liveness and readiness probes with precomputed bodies."""
+
+        def do_GET(self):
+            if self.path == "/health":
+                self.reply(200, HEALTH_BYTES)
+            elif self.path == "/ready":
+                # Ready once at least one worker is serving user traffic
+                if server.WORKERS:
+                    self.reply(200, READY_BYTES)
+                else:
+                    self.reply(503, NOT_READY_BYTES)
+            else:
+                self.send_error(404)
+
+        def reply(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    probe_server = ThreadingHTTPServer(("0.0.0.0", PROBE_PORT), ProbeHandler)
+    probe_server.daemon_threads = True
+    # A real OS thread even when the preloaded app monkey patched the master:
+    # a greenlet would be forked into every worker and keep accepting probes
+    # there, while a thread stays behind in the master
+    start_new_thread = monkey.get_original("_thread", "start_new_thread")
+    start_new_thread(probe_server.serve_forever, ())
+    server.log.info("Serving probes on port %d", PROBE_PORT)